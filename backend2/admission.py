@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+# Lower value is served first when the priority lane is enabled
+PRIORITY_SUBTITLES = 0
+PRIORITY_WHISPER = 1
+
+
+class QueueFullError(Exception):
+    """Raised when a stage already has as many waiting jobs as its queue allows"""
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"{stage} queue is full, retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """Concurrency limit plus a bounded, optionally prioritised wait queue for one pipeline stage.
+
+    Work passed to run() executes in a worker thread once a slot is free, so it does
+    not block the event loop and new work can be rejected immediately when the queue
+    is full. Blocking calls made outside run() still hold the loop.
+    """
+    def __init__(self, name: str, max_concurrent: int, max_queue: int,
+                 retry_after: int = 30, use_priority: bool = True):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self.use_priority = use_priority
+
+        self._active = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+        self._admitted = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._completed = 0
+        self._total_run = 0.0
+
+    def _estimate_retry_after(self) -> int:
+        if not self._completed:
+            return self.retry_after
+        avg_run = self._total_run / self._completed
+        backlog = len(self._waiters) + self._active
+        return max(1, math.ceil(avg_run * backlog / self.max_concurrent))
+
+    def ensure_capacity(self):
+        """Fail fast with QueueFullError if a new job could neither start nor queue right now"""
+        if self._active >= self.max_concurrent and len(self._waiters) >= self.max_queue:
+            self._rejected += 1
+            raise QueueFullError(self.name, self._estimate_retry_after())
+
+    async def _acquire(self, priority: int):
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self._admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._rejected += 1
+            raise QueueFullError(self.name, self._estimate_retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority if self.use_priority else 0, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before we were cancelled
+                self._release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+        waited = time.monotonic() - started
+        self._admitted += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter, _active is unchanged
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    async def run(self, func: Callable, *args, priority: int = PRIORITY_WHISPER, **kwargs) -> Any:
+        """Wait for a slot (or fail fast with QueueFullError) and run func in a worker thread"""
+        await self._acquire(priority)
+        started = time.monotonic()
+
+        def _finished(_):
+            self._completed += 1
+            self._total_run += time.monotonic() - started
+            self._release()
+
+        # The slot is only freed when the thread is done, even if the request is cancelled
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        task.add_done_callback(_finished)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'active': self._active,
+            'queued': len(self._waiters),
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'admitted': self._admitted,
+            'rejected': self._rejected,
+            'completed': self._completed,
+            'avg_wait_seconds': self._total_wait / self._admitted if self._admitted else 0.0,
+            'max_wait_seconds': self._max_wait,
+            'avg_run_seconds': self._total_run / self._completed if self._completed else 0.0,
+        }
+
+
+class InFlightJobs:
+    """Coalesces concurrent jobs with the same key onto one running task.
+
+    Later callers await the first caller's task instead of repeating the work, so two
+    requests for the same video never share its media folder or checkpoint.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(self, key: str, job: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(job())
+            self._tasks[key] = task
+
+            def _forget(done_task):
+                if self._tasks.get(key) is done_task:
+                    del self._tasks[key]
+            task.add_done_callback(_forget)
+        else:
+            print(f"Joining in-flight {self.name} job for {key}")
+        # One caller disconnecting must not cancel the job for the others
+        return await asyncio.shield(task)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        print(f"Debug - Invalid value for {name}, using {default}")
+        return default
+
+
+_retry_after = _env_int('ADMISSION_RETRY_AFTER', 30)
+_use_priority = os.getenv('ADMISSION_PRIORITY_LANE', '1').lower() not in ('0', 'false', 'no')
+
+# yt-dlp extract_info plus the VTT download: network bound, so several can overlap
+subtitle_limiter = StageLimiter(
+    'subtitles',
+    max_concurrent=_env_int('SUBTITLE_MAX_CONCURRENCY', 4),
+    max_queue=_env_int('SUBTITLE_MAX_QUEUE', 16),
+    retry_after=_retry_after,
+    use_priority=_use_priority,
+)
+# Jobs for the same video/upload are coalesced in api.py. Every slot loads its own Whisper
+# model (they can't be shared across threads), so each extra slot costs a full model in memory
+whisper_limiter = StageLimiter(
+    'whisper',
+    max_concurrent=_env_int('WHISPER_MAX_CONCURRENCY', 1),
+    max_queue=_env_int('WHISPER_MAX_QUEUE', 4),
+    retry_after=_retry_after,
+    use_priority=_use_priority,
+)
+llm_limiter = StageLimiter(
+    'llm',
+    max_concurrent=_env_int('LLM_MAX_CONCURRENCY', 1),
+    max_queue=_env_int('LLM_MAX_QUEUE', 8),
+    retry_after=_retry_after,
+    use_priority=_use_priority,
+)
+
+
+def admission_stats() -> Dict[str, Dict[str, Any]]:
+    return {limiter.name: limiter.stats() for limiter in (subtitle_limiter, whisper_limiter, llm_limiter)}
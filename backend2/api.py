@@ -1,5 +1,11 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from mp4_downloader import *
+from whisper_transcriber import transcribe_file
+from upload_store import (save_multipart_stream, load_cached_result, save_cached_result, discard_upload_media,
+                          UploadTooLargeError, UPLOAD_MAX_BYTES)
+from token_chunker import build_chunker, TokenAwareChunker
+from admission import (QueueFullError, InFlightJobs, subtitle_limiter, whisper_limiter, llm_limiter, admission_stats,
+                       PRIORITY_SUBTITLES, PRIORITY_WHISPER)
 from pydantic import BaseModel, validator
 from typing import Dict, Tuple
 import re
@@ -11,10 +17,10 @@ from langchain_community.llms import Ollama
 from langchain_core.callbacks import CallbackManager, StreamingStdOutCallbackHandler
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains.summarize import load_summarize_chain
-from langchain.text_splitter import TokenTextSplitter
 from langchain.schema import Document
 
 import os
+import threading
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -38,12 +44,16 @@ class VideoRequest(BaseModel):
             raise ValueError('Invalid YouTube URL')
         return v
     
+OLLAMA_BASE_URL = "http://localhost:11434"
+LLM_MODEL = "quantphi"
+LLM_OUTPUT_TOKENS = 512
+
 def initialize_llm():
     callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
-    return Ollama(base_url="http://localhost:11434", model="quantphi", callback_manager=callback_manager)
+    return Ollama(base_url=OLLAMA_BASE_URL, model=LLM_MODEL, callback_manager=callback_manager,
+                  num_predict=LLM_OUTPUT_TOKENS)
 
 llm = initialize_llm()
-text_splitter = TokenTextSplitter(chunk_size=10000, chunk_overlap=200)
 
 map_template = """<|system|>
 You are an AI assistant specialized in understanding and concisely describing video content.
@@ -77,6 +87,24 @@ Please incorporate this new information and create a single, concise paragraph t
 <|assistant|>
 """
 refine_prompt = ChatPromptTemplate.from_template(refine_template)
+
+# Chunk size comes from the served model's context window and vocabulary. It is cached
+# only once Ollama has answered, so a model that isn't up yet is picked up on a later summary.
+_chunker = None
+_chunker_lock = threading.Lock()
+
+def get_chunker() -> TokenAwareChunker:
+    global _chunker
+    with _chunker_lock:
+        if _chunker is None:
+            _chunker = build_chunker(OLLAMA_BASE_URL, LLM_MODEL, [map_template, refine_template],
+                                     output_tokens=LLM_OUTPUT_TOKENS)
+        return _chunker
+
+try:
+    get_chunker()
+except RuntimeError as e:
+    print(f"Warning - {e}; retrying on the first summary")
 summarize_chain = load_summarize_chain(
     llm,
     chain_type="refine",
@@ -88,43 +116,114 @@ summarize_chain = load_summarize_chain(
     verbose=True
 )
 
-def summarize_transcript(transcript):
-    chunks = text_splitter.split_text(transcript)
+def _run_summarize_chain(segments: List[str], label: str):
+    chunker = get_chunker()
+    chunks = chunker.split_segments(segments)
     docs = [Document(page_content=chunk) for chunk in chunks]
     result = summarize_chain({"input_documents": docs})
+    # The refine chain makes one LLM call per chunk, each recorded as an intermediate step
+    llm_calls = len(result.get("intermediate_steps", docs))
+    print(f"Summarized {label}: {len(segments)} segments -> {len(chunks)} chunks "
+          f"of <= {chunker.chunk_tokens} tokens, {llm_calls} LLM calls")
     return result["output_text"]
 
-def get_text_from_subtitles(subtitle_dict: Dict[str, str]) -> str:
-    """Extract only text content from subtitle dictionary"""
+async def summarize_transcript(segments: List[str], priority: int = PRIORITY_WHISPER, label: str = ""):
+    """Summarize through the LLM stage limiter; raises QueueFullError when it is saturated"""
+    return await llm_limiter.run(_run_summarize_chain, segments, label, priority=priority)
+
+def queue_full_exception(e: QueueFullError) -> HTTPException:
+    print(f"Rejecting request: {e}")
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def get_segments_from_subtitles(subtitle_dict: Dict[str, str]) -> List[str]:
+    """Extract the text of each cue/segment from subtitle dictionary, in order"""
     try:
         if not subtitle_dict:
-            return ""
+            return []
         if isinstance(subtitle_dict, dict):
-            # Join all text values from the dictionary
-            return " ".join(str(text) if isinstance(text, str) else 
-                          text[0]['text'] if isinstance(text, list) else str(text) 
-                          for text in subtitle_dict.values())
+            return [str(text) if isinstance(text, str) else 
+                    text[0]['text'] if isinstance(text, list) else str(text) 
+                    for text in subtitle_dict.values()]
         elif isinstance(subtitle_dict, str):
-            return subtitle_dict
+            return [subtitle_dict]
         else:
             print(f"Debug - unexpected subtitle_dict type: {type(subtitle_dict)}")
-            return str(subtitle_dict)
+            return [str(subtitle_dict)]
     except Exception as e:
-        print(f"Debug - Error in get_text_from_subtitles: {str(e)}")
+        print(f"Debug - Error in get_segments_from_subtitles: {str(e)}")
         raise
 
+def format_whisper_transcription(transcription) -> Dict[str, List[Dict[str, Any]]]:
+    """Convert WhisperTranscriber output into the per-range segment format used by the API"""
+    formatted_transcription = {}
+    
+    if isinstance(transcription, dict):
+        for time_range, text in transcription.items():
+            try:
+                # Parse the time range string (e.g., "00:00:30 - 00:01:00")
+                start_time = time_range.split(' - ')[0]
+                end_time = time_range.split(' - ')[1]
+                
+                # Convert start time to seconds
+                h, m, s = map(float, start_time.split(':'))
+                start_seconds = h * 3600 + m * 60 + s
+                
+                formatted_transcription[time_range] = [{
+                    'start': start_seconds,
+                    'text': str(text),
+                    'display_time': start_time
+                }]
+            except Exception as e:
+                print(f"Error parsing time range {time_range}: {e}")
+                continue
+    else:
+        # For non-dict transcriptions, try to extract timestamp from the data
+        try:
+            import re
+            timestamp_pattern = r'(\d{2}):(\d{2}):(\d{2})'
+            matches = re.findall(timestamp_pattern, str(transcription))
+            if matches:
+                start_time = matches[0]
+                seconds = int(start_time[0]) * 3600 + int(start_time[1]) * 60 + int(start_time[2])
+            else:
+                seconds = 0
+                
+            formatted_transcription = {"00:00:00 - 00:00:30": [{
+                'start': seconds,
+                'text': str(transcription),
+                'display_time': f"{int(seconds//3600):02d}:{int((seconds%3600)//60):02d}:{int(seconds%60):02d}"
+            }]}
+        except Exception as e:
+            print(f"Error parsing timestamp: {e}")
+            formatted_transcription = {"00:00:00 - 00:00:30": [{
+                'start': 0.0,
+                'text': str(transcription),
+                'display_time': '00:00:00'
+            }]}
+    return formatted_transcription
+
+# One transcription per video id at a time: concurrent requests share the running job
+video_jobs = InFlightJobs('video')
+
+def download_and_transcribe(video_url: str) -> Dict[str, str]:
+    """Download, convert and Whisper-transcribe a video (blocking, runs in the whisper stage)"""
+    audio_path = process_youtube_video(video_url)
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError("Audio file not found")
+    return transcribe_file(audio_path)
+
 async def get_transcription(video_url: str) -> Tuple[Dict[str, str], bool, str]:
     """Get transcription either from subtitles or Whisper and return with source info"""
     try:
         # Try getting subtitles first
         print("Debug - Fetching subtitles...")
-        subtitle_dict = extract_subtitles(video_url)
+        subtitle_dict = await subtitle_limiter.run(extract_subtitles, video_url, priority=PRIORITY_SUBTITLES)
     
         if subtitle_dict:
             print("Using YouTube subtitles")
             grouped_subtitles = group_subtitles_by_interval(subtitle_dict)
-            text_content = get_text_from_subtitles(grouped_subtitles)
-            summary = summarize_transcript(text_content)
+            segments = get_segments_from_subtitles(grouped_subtitles)
+            summary = await summarize_transcript(segments, priority=PRIORITY_SUBTITLES, label=video_url)
             formatted_subtitles = {}
             for time_range, text in grouped_subtitles.items():
                 start_time = time_range.split(' - ')[0]
@@ -139,63 +238,17 @@ async def get_transcription(video_url: str) -> Tuple[Dict[str, str], bool, str]:
         # Download and process video if no subtitles available
         print("No subtitles found, using Whisper transcription")
         try:
-            process_youtube_video(video_url)
-            transcriber = get_transcriber()
-            audio_path = os.path.join('Saved_Media', 'audio.mp3')
-            if not os.path.exists(audio_path):
-                raise FileNotFoundError("Audio file not found")
-            
-            transcription = transcriber.transcribe(audio_path)
-            formatted_transcription = {}
-            
-            if isinstance(transcription, dict):
-                for time_range, text in transcription.items():
-                    try:
-                        # Parse the time range string (e.g., "00:00:30 - 00:01:00")
-                        start_time = time_range.split(' - ')[0]
-                        end_time = time_range.split(' - ')[1]
-                        
-                        # Convert start time to seconds
-                        h, m, s = map(float, start_time.split(':'))
-                        start_seconds = h * 3600 + m * 60 + s
-                        
-                        formatted_transcription[time_range] = [{
-                            'start': start_seconds,
-                            'text': str(text),
-                            'display_time': start_time
-                        }]
-                    except Exception as e:
-                        print(f"Error parsing time range {time_range}: {e}")
-                        continue
-            else:
-                # For non-dict transcriptions, try to extract timestamp from the data
-                try:
-                    import re
-                    timestamp_pattern = r'(\d{2}):(\d{2}):(\d{2})'
-                    matches = re.findall(timestamp_pattern, str(transcription))
-                    if matches:
-                        start_time = matches[0]
-                        seconds = int(start_time[0]) * 3600 + int(start_time[1]) * 60 + int(start_time[2])
-                    else:
-                        seconds = 0
-                        
-                    formatted_transcription = {"00:00:00 - 00:00:30": [{
-                        'start': seconds,
-                        'text': str(transcription),
-                        'display_time': f"{int(seconds//3600):02d}:{int((seconds%3600)//60):02d}:{int(seconds%60):02d}"
-                    }]}
-                except Exception as e:
-                    print(f"Error parsing timestamp: {e}")
-                    formatted_transcription = {"00:00:00 - 00:00:30": [{
-                        'start': 0.0,
-                        'text': str(transcription),
-                        'display_time': '00:00:00'
-                    }]}
+            transcription = await whisper_limiter.run(download_and_transcribe, video_url, priority=PRIORITY_WHISPER)
+            formatted_transcription = format_whisper_transcription(transcription)
             
-            text_content = get_text_from_subtitles(transcription)
-            summary = summarize_transcript(text_content)
+            segments = get_segments_from_subtitles(transcription)
+            summary = await summarize_transcript(segments, priority=PRIORITY_WHISPER, label=video_url)
+            # Kept until now so a failed summary can be retried from the checkpoint
+            discard_video_media(video_url)
             return formatted_transcription, False, summary
             
+        except QueueFullError:
+            raise
         except Exception as e:
             raise Exception(f"Whisper transcription failed: {str(e)}")
     except Exception as e:
@@ -227,7 +280,9 @@ async def transcribe_youtube_video(request: VideoRequest):
     try:
         print(f"Received URL: {request.youtube_video_url}")
         
-        transcriptions, is_youtube, summary = await get_transcription(request.youtube_video_url)
+        video_url = request.youtube_video_url
+        transcriptions, is_youtube, summary = await video_jobs.run(
+            get_video_id(video_url), lambda: get_transcription(video_url))
         if not transcriptions:
             raise HTTPException(status_code=404, detail="Transcription failed")
         
@@ -239,12 +294,94 @@ async def transcribe_youtube_video(request: VideoRequest):
             source="youtube" if is_youtube else "whisper"
         )
         
+    except QueueFullError as e:
+        raise queue_full_exception(e)
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     
+# One transcription per content hash at a time: identical uploads share the running job
+upload_jobs = InFlightJobs('upload')
+
+async def process_upload(media_path: str, content_hash: str, label: str) -> Dict[str, Any]:
+    """Return the stored result for this content, or transcribe, summarize and store it"""
+    cached = load_cached_result(content_hash)
+    if cached:
+        print(f"Reusing stored transcript for upload {content_hash}")
+        discard_upload_media(content_hash)
+        return cached
+
+    transcription = await whisper_limiter.run(transcribe_file, media_path,
+                                              priority=PRIORITY_WHISPER)
+    transcriptions = format_whisper_transcription(transcription)
+    if not transcriptions:
+        raise HTTPException(status_code=404, detail="Transcription failed")
+    summary = await summarize_transcript(get_segments_from_subtitles(transcription),
+                                         priority=PRIORITY_WHISPER, label=label)
+    result = {
+        'transcriptions': transcriptions,
+        'summary': summary
+    }
+    save_cached_result(content_hash, result)
+    # The stored result is all a repeat upload needs; the media and checkpoint can go
+    discard_upload_media(content_hash)
+    return result
+
+# The body is parsed straight from the request stream, so document the form for /docs by hand
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"]
+        }}}
+    }
+}
+
+@app.post("/upload", response_model=LinkedSummaryResponse, openapi_extra=UPLOAD_OPENAPI)
+async def transcribe_uploaded_file(request: Request):
+    """Summarize a local audio/video file; identical content reuses the stored result"""
+    try:
+        # Refuse before reading any of the body if it is too big or Whisper is saturated
+        content_length = request.headers.get('content-length')
+        if content_length and content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES:
+            raise UploadTooLargeError(UPLOAD_MAX_BYTES)
+        whisper_limiter.ensure_capacity()
+
+        media_path, content_hash, filename = await save_multipart_stream(
+            request.stream(), request.headers.get('content-type', ''))
+        print(f"Received upload: {filename}")
+
+        result = await upload_jobs.run(
+            content_hash, lambda: process_upload(media_path, content_hash, filename))
+
+        return LinkedSummaryResponse(
+            summary=result['summary'],
+            linked_segments=[],
+            transcriptions=result['transcriptions'],
+            source="whisper"
+        )
+
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise queue_full_exception(e)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admission-stats")
+async def get_admission_stats():
+    """Per-stage queue depth, wait and run times for capacity planning"""
+    return admission_stats()
+
 class MatchRequest(BaseModel):
     paragraph_text: str
 
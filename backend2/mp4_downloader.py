@@ -48,20 +48,48 @@ def download_youtube_video_and_audio(video_url, output_dir='Saved_Media'):
     print("Video and audio download completed!")
 
 def convert_audio_to_mp3(input_audio_path, output_mp3_path):
+    # Write to a temporary name first so an interrupted conversion never looks finished
+    tmp_mp3_path = output_mp3_path + '.part.mp3'
     audio = AudioFileClip(input_audio_path)
-    audio.write_audiofile(output_mp3_path)
+    audio.write_audiofile(tmp_mp3_path)
     audio.close()
+    os.replace(tmp_mp3_path, output_mp3_path)
     print("Audio conversion to MP3 completed!")
 
-def process_youtube_video(video_url):
-    output_dir = 'Saved_Media'
+def get_video_id(video_url):
+    match = re.search(r'(?:v=|youtu\.be/)([a-zA-Z0-9_-]+)', video_url)
+    if not match:
+        raise ValueError(f"Could not extract video id from URL: {video_url}")
+    return match.group(1)
+
+def process_youtube_video(video_url, media_root='Saved_Media'):
+    """Download and convert a video's audio into its own folder and return the MP3 path.
+
+    Each video gets Saved_Media/<video_id>/, so a retried job reuses an already
+    converted audio.mp3 (and any transcription checkpoint next to it). The folder
+    is removed with discard_video_media() once the job succeeds.
+    """
+    output_dir = os.path.join(media_root, get_video_id(video_url))
+    output_mp3_path = os.path.join(output_dir, 'audio.mp3')
+
+    if os.path.exists(output_mp3_path):
+        print(f"Reusing downloaded audio: {output_mp3_path}")
+        return output_mp3_path
     
     download_youtube_video_and_audio(video_url, output_dir)
     
     input_audio_path = os.path.join(output_dir, 'audio.webm')
-    output_mp3_path = os.path.join(output_dir, 'audio.mp3')
     
     convert_audio_to_mp3(input_audio_path, output_mp3_path)
+    # Only the MP3 is needed from here on
+    os.remove(input_audio_path)
+    return output_mp3_path
+
+def discard_video_media(video_url, media_root='Saved_Media'):
+    """Delete a video's folder (audio and transcription checkpoint) once its job has succeeded"""
+    output_dir = os.path.join(media_root, get_video_id(video_url))
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir, ignore_errors=True)
 
 def clean_captions(raw_captions):
     try:
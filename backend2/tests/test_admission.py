@@ -0,0 +1,172 @@
+import asyncio
+import threading
+
+import pytest
+
+from admission import InFlightJobs, QueueFullError, StageLimiter
+
+
+async def settle():
+    """Let freshly created tasks run up to their first await"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def blocking_job(gate: threading.Event, log: list, name: str):
+    def job():
+        gate.wait(5)
+        log.append(name)
+        return name
+    return job
+
+
+def test_full_queue_is_rejected_immediately():
+    async def main():
+        limiter = StageLimiter('t', max_concurrent=1, max_queue=1, retry_after=7)
+        gate, log = threading.Event(), []
+        running = asyncio.create_task(limiter.run(blocking_job(gate, log, 'a')))
+        await settle()
+        queued = asyncio.create_task(limiter.run(blocking_job(gate, log, 'b')))
+        await settle()
+
+        with pytest.raises(QueueFullError) as excinfo:
+            await limiter.run(blocking_job(gate, log, 'c'))
+        assert excinfo.value.retry_after == 7
+        with pytest.raises(QueueFullError):
+            limiter.ensure_capacity()
+
+        gate.set()
+        assert await asyncio.gather(running, queued) == ['a', 'b']
+        stats = limiter.stats()
+        assert stats['rejected'] == 2
+        assert stats['completed'] == 2
+        assert stats['active'] == 0 and stats['queued'] == 0
+        limiter.ensure_capacity()
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("use_priority, expected", [
+    (True, ['first', 'urgent', 'normal']),
+    (False, ['first', 'normal', 'urgent']),
+])
+def test_waiters_are_served_by_priority_then_arrival(use_priority, expected):
+    async def main():
+        limiter = StageLimiter('t', max_concurrent=1, max_queue=5, use_priority=use_priority)
+        gate, log = threading.Event(), []
+        tasks = [asyncio.create_task(limiter.run(blocking_job(gate, log, 'first'), priority=1))]
+        await settle()
+        tasks.append(asyncio.create_task(limiter.run(blocking_job(gate, log, 'normal'), priority=1)))
+        await settle()
+        tasks.append(asyncio.create_task(limiter.run(blocking_job(gate, log, 'urgent'), priority=0)))
+        await settle()
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert log == expected
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        limiter = StageLimiter('t', max_concurrent=1, max_queue=1)
+        gate, log = threading.Event(), []
+        running = asyncio.create_task(limiter.run(blocking_job(gate, log, 'a')))
+        await settle()
+        waiting = asyncio.create_task(limiter.run(blocking_job(gate, log, 'b')))
+        await settle()
+        assert limiter.stats()['queued'] == 1
+
+        waiting.cancel()
+        await settle()
+        assert limiter.stats()['queued'] == 0
+        # The freed queue place can be used again
+        again = asyncio.create_task(limiter.run(blocking_job(gate, log, 'c')))
+        await settle()
+        assert limiter.stats()['queued'] == 1
+
+        gate.set()
+        await asyncio.gather(running, again)
+        assert log == ['a', 'c']
+        assert limiter.stats()['active'] == 0
+    asyncio.run(main())
+
+
+def test_slot_is_held_until_the_thread_finishes_even_if_cancelled():
+    async def main():
+        limiter = StageLimiter('t', max_concurrent=1, max_queue=0)
+        gate, log = threading.Event(), []
+        running = asyncio.create_task(limiter.run(blocking_job(gate, log, 'a')))
+        await settle()
+        running.cancel()
+        await settle()
+        # The worker thread is still busy, so the slot must still be taken
+        with pytest.raises(QueueFullError):
+            await limiter.run(blocking_job(gate, log, 'b'))
+
+        gate.set()
+        while limiter.stats()['active']:
+            await asyncio.sleep(0.01)
+        assert await limiter.run(blocking_job(gate, log, 'c')) == 'c'
+    asyncio.run(main())
+
+
+def test_in_flight_jobs_coalesce_by_key():
+    async def main():
+        jobs = InFlightJobs('t')
+        calls = []
+        release = asyncio.Event()
+
+        async def job(key):
+            calls.append(key)
+            await release.wait()
+            return f"result-{key}"
+
+        tasks = [asyncio.create_task(jobs.run(key, lambda key=key: job(key))) for key in ('a', 'a', 'b')]
+        await settle()
+        release.set()
+        assert await asyncio.gather(*tasks) == ['result-a', 'result-a', 'result-b']
+        assert sorted(calls) == ['a', 'b']
+
+        # Once finished, the same key runs again instead of reusing the old result
+        assert await jobs.run('a', lambda: job('a')) == 'result-a'
+        assert calls.count('a') == 2
+    asyncio.run(main())
+
+
+def test_in_flight_failure_reaches_every_caller_and_is_not_cached():
+    async def main():
+        jobs = InFlightJobs('t')
+        attempts = []
+
+        async def failing():
+            attempts.append(1)
+            await asyncio.sleep(0)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(jobs.run('k', failing), jobs.run('k', failing),
+                                       return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(attempts) == 1
+
+        with pytest.raises(RuntimeError):
+            await jobs.run('k', failing)
+        assert len(attempts) == 2
+    asyncio.run(main())
+
+
+def test_one_caller_cancelling_does_not_cancel_the_shared_job():
+    async def main():
+        jobs = InFlightJobs('t')
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+            return 'done'
+
+        first = asyncio.create_task(jobs.run('k', job))
+        second = asyncio.create_task(jobs.run('k', job))
+        await settle()
+        first.cancel()
+        await settle()
+        release.set()
+        assert await second == 'done'
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+import pytest
+
+import token_chunker
+from token_chunker import TokenAwareChunker, VocabTokenCounter, build_chunker, fallback_token_counter
+
+
+def model_info(tokenizer_model, tokens=("▁the", "▁cat")):
+    return {'context_length': 4096, 'tokenizer_model': tokenizer_model, 'tokens': list(tokens)}
+
+
+@pytest.mark.parametrize("tokenizer_model, expected_counter", [
+    ("llama", VocabTokenCounter),
+    ("gpt2", type(fallback_token_counter)),
+    (None, type(fallback_token_counter)),
+])
+def test_vocab_counter_only_for_sentencepiece(monkeypatch, tokenizer_model, expected_counter):
+    monkeypatch.setattr(token_chunker, "fetch_model_info", lambda base_url, model: model_info(tokenizer_model))
+    chunker = build_chunker("http://ollama", "m", ["prompt {text}"], output_tokens=100)
+    assert isinstance(chunker.count_tokens, expected_counter)
+
+
+def test_vocab_counter_gets_the_larger_safety_margin(monkeypatch):
+    monkeypatch.setattr(token_chunker, "fetch_model_info", lambda base_url, model: model_info("llama"))
+    vocab = build_chunker("http://ollama", "m", ["p"], output_tokens=100)
+    monkeypatch.setattr(token_chunker, "fetch_model_info", lambda base_url, model: model_info("gpt2"))
+    fallback = build_chunker("http://ollama", "m", ["p"], output_tokens=100)
+    assert vocab.chunk_tokens < fallback.chunk_tokens
+
+
+def test_fetch_model_info_reads_context_and_tokenizer(monkeypatch):
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {
+                'parameters': 'temperature 0.7\nnum_ctx 8192',
+                'model_info': {
+                    'phi3.context_length': 131072,
+                    'tokenizer.ggml.model': 'llama',
+                    'tokenizer.ggml.tokens': ['▁a', 'b'],
+                },
+            }
+    monkeypatch.setattr(token_chunker.requests, "post", lambda *args, **kwargs: Response())
+
+    info = token_chunker.fetch_model_info("http://ollama", "m")
+    assert info == {'context_length': 8192, 'tokenizer_model': 'llama', 'tokens': ['▁a', 'b']}
+
+
+def test_build_chunker_raises_when_ollama_is_unreachable(monkeypatch):
+    def unreachable(base_url, model):
+        raise ConnectionError("refused")
+    monkeypatch.setattr(token_chunker, "fetch_model_info", unreachable)
+    with pytest.raises(RuntimeError):
+        build_chunker("http://ollama", "m", ["p"])
+
+
+def word_counter(text: str) -> int:
+    """One token per whitespace-separated word keeps the expected chunk sizes obvious"""
+    return len(text.split())
+
+
+def chunker_with_budget(chunk_tokens: int) -> TokenAwareChunker:
+    chunker = TokenAwareChunker(context_length=1000, count_tokens=word_counter,
+                                prompt_tokens=0, output_tokens=0, safety_margin=0)
+    chunker.chunk_tokens = chunk_tokens
+    return chunker
+
+
+def test_segments_are_packed_without_splitting_them():
+    chunker = chunker_with_budget(10)
+    segments = ["one two three", "four five six", "seven eight nine", "ten"]
+    chunks = chunker.split_segments(segments)
+
+    # Each joined segment costs its words plus one for the separator
+    assert chunks == ["one two three four five six", "seven eight nine ten"]
+    assert all(word_counter(c) <= chunker.chunk_tokens for c in chunks)
+
+
+def test_blank_segments_are_skipped():
+    assert chunker_with_budget(10).split_segments(["  ", "", "hello"]) == ["hello"]
+
+
+def test_oversized_segment_splits_on_sentences():
+    chunker = chunker_with_budget(5)
+    segment = "First short sentence here. Second one is here too. Third."
+    chunks = chunker.split_segments([segment])
+
+    assert chunks == ["First short sentence here.", "Second one is here too.", "Third."]
+
+
+def test_oversized_sentence_falls_back_to_words():
+    chunker = chunker_with_budget(4)
+    chunks = chunker.split_segments(["a b c d e f g h i j"])
+
+    assert chunks == ["a b c d", "e f g h", "i j"]
+    assert all(word_counter(c) <= 4 for c in chunks)
+
+
+def test_word_longer_than_a_chunk_is_cut_by_characters():
+    chunker = TokenAwareChunker(context_length=100, count_tokens=fallback_token_counter,
+                                prompt_tokens=20, output_tokens=10, safety_margin=0.1)
+    chunks = chunker.split_segments(["intro", "x" * 500, "outro"])
+
+    # Nothing is lost, and every chunk fits even though the word had no boundaries
+    assert "".join(chunks).replace(" ", "") == "intro" + "x" * 500 + "outro"
+    assert len(chunks) > 1
+    assert all(fallback_token_counter(c) <= chunker.chunk_tokens for c in chunks)
+
+
+def test_chunk_budget_leaves_room_for_prompt_and_output():
+    chunker = TokenAwareChunker(context_length=1000, count_tokens=word_counter,
+                                prompt_tokens=200, output_tokens=100, safety_margin=0.1)
+    assert chunker.chunk_tokens == 900 - 200 - 100
+    with pytest.raises(ValueError):
+        TokenAwareChunker(context_length=100, count_tokens=word_counter,
+                          prompt_tokens=80, output_tokens=50)
+
+
+def test_segments_are_counted_once():
+    calls = []
+
+    def counting(text):
+        calls.append(text)
+        return word_counter(text)
+
+    chunker = TokenAwareChunker(context_length=1000, count_tokens=counting,
+                                prompt_tokens=0, output_tokens=0, safety_margin=0)
+    segments = [f"segment {i}" for i in range(20)]
+    chunker.split_segments(segments)
+    assert calls == segments
+
+
+def test_vocab_counter_matches_sentencepiece_pieces():
+    counter = VocabTokenCounter(["▁", "▁the", "▁cat", "▁sat", "."])
+    assert counter("the cat sat.") == 4
+    # Characters outside the vocabulary cost one token per UTF-8 byte
+    assert counter("the é") == 1 + 1 + 2
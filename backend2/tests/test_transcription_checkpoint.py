@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+pytest.importorskip("librosa")
+
+from whisper_transcriber import CHECKPOINT_SUFFIX, WHISPER_SAMPLE_RATE, WhisperTranscriber
+
+WINDOW = 10
+
+
+class FakeModel:
+    """Returns one segment per window and can be told to crash on the n-th call"""
+    def __init__(self, fail_on_call=None):
+        self.fail_on_call = fail_on_call
+        self.prompts = []
+
+    def transcribe(self, audio, **kwargs):
+        self.prompts.append(kwargs.get('initial_prompt'))
+        if len(self.prompts) == self.fail_on_call:
+            raise RuntimeError("worker restarted")
+        return {'segments': [{'start': 0.0, 'end': len(audio) / WHISPER_SAMPLE_RATE,
+                              'text': f" part {len(self.prompts)} "}]}
+
+
+def make_transcriber(model, total_seconds, probed=True, short_by=0):
+    transcriber = WhisperTranscriber()
+    transcriber._model = model
+    transcriber.decoded_offsets = []
+    transcriber.probe_duration = lambda path: float(total_seconds) if probed else None
+
+    def load_audio_window(path, start, duration):
+        transcriber.decoded_offsets.append(start)
+        remaining = int((total_seconds - start) * WHISPER_SAMPLE_RATE)
+        # Full windows can come back a few samples short from seeking/resampling
+        samples = min(remaining, int(duration * WHISPER_SAMPLE_RATE) - short_by)
+        return np.zeros(max(0, samples), dtype=np.float32)
+    transcriber.load_audio_window = load_audio_window
+    return transcriber
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(b"fake audio bytes")
+    return str(path)
+
+
+def read_checkpoint(audio_file):
+    with open(audio_file + CHECKPOINT_SUFFIX) as f:
+        return json.load(f)
+
+
+def test_full_run_writes_checkpoint_with_audio_hash(audio_file):
+    transcriber = make_transcriber(FakeModel(), total_seconds=25)
+    result = transcriber.transcribe(audio_file, window_seconds=WINDOW)
+
+    assert list(result.values()) == ['part 1', 'part 2', 'part 3']
+    assert list(result)[1] == '00:00:10 - 00:00:20'
+    state = read_checkpoint(audio_file)
+    assert state['total_windows'] == 3 and state['completed_windows'] == 3
+    assert len(state['audio_hash']) == 64
+
+
+def test_retry_resumes_from_last_finished_window(audio_file):
+    with pytest.raises(RuntimeError):
+        make_transcriber(FakeModel(fail_on_call=2), total_seconds=25).transcribe(audio_file, window_seconds=WINDOW)
+    assert read_checkpoint(audio_file)['completed_windows'] == 1
+
+    model = FakeModel()
+    transcriber = make_transcriber(model, total_seconds=25)
+    result = transcriber.transcribe(audio_file, window_seconds=WINDOW)
+
+    # Window 1 is neither decoded nor transcribed again, and its text seeds the next window
+    assert transcriber.decoded_offsets == [10, 20]
+    assert model.prompts == ['part 1', 'part 1']
+    assert list(result.values()) == ['part 1', 'part 1', 'part 2']
+
+
+def test_finished_checkpoint_skips_all_work(audio_file):
+    make_transcriber(FakeModel(), total_seconds=25).transcribe(audio_file, window_seconds=WINDOW)
+
+    model = FakeModel()
+    transcriber = make_transcriber(model, total_seconds=25)
+    assert len(transcriber.transcribe(audio_file, window_seconds=WINDOW)) == 3
+    assert model.prompts == [] and transcriber.decoded_offsets == []
+
+
+def test_changed_audio_starts_over(audio_file):
+    with pytest.raises(RuntimeError):
+        make_transcriber(FakeModel(fail_on_call=2), total_seconds=25).transcribe(audio_file, window_seconds=WINDOW)
+    with open(audio_file, 'wb') as f:
+        f.write(b"different audio")
+
+    transcriber = make_transcriber(FakeModel(), total_seconds=25)
+    transcriber.transcribe(audio_file, window_seconds=WINDOW)
+    assert transcriber.decoded_offsets == [0, 10, 20]
+
+
+def test_different_window_size_starts_over(audio_file):
+    with pytest.raises(RuntimeError):
+        make_transcriber(FakeModel(fail_on_call=2), total_seconds=25).transcribe(audio_file, window_seconds=WINDOW)
+
+    transcriber = make_transcriber(FakeModel(), total_seconds=25)
+    transcriber.transcribe(audio_file, window_seconds=5)
+    assert transcriber.decoded_offsets[0] == 0
+    assert read_checkpoint(audio_file)['total_windows'] == 5
+
+
+def test_unreadable_checkpoint_is_ignored(audio_file):
+    with open(audio_file + CHECKPOINT_SUFFIX, 'w') as f:
+        f.write("{not json")
+    result = make_transcriber(FakeModel(), total_seconds=25).transcribe(audio_file, window_seconds=WINDOW)
+    assert len(result) == 3
+
+
+def test_short_full_windows_do_not_end_transcription(audio_file):
+    transcriber = make_transcriber(FakeModel(), total_seconds=25, short_by=3)
+    transcriber.transcribe(audio_file, window_seconds=WINDOW)
+    assert transcriber.decoded_offsets == [0, 10, 20]
+
+
+def test_unknown_duration_stops_on_empty_window(audio_file):
+    transcriber = make_transcriber(FakeModel(), total_seconds=20, probed=False, short_by=3)
+    result = transcriber.transcribe(audio_file, window_seconds=WINDOW)
+
+    assert transcriber.decoded_offsets == [0, 10, 20]
+    assert len(result) == 2
+    assert read_checkpoint(audio_file)['total_windows'] == 2
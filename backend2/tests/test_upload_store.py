@@ -0,0 +1,71 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip("python_multipart")
+
+import upload_store
+
+BOUNDARY = "testboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def multipart_body(payload: bytes, field: str = "file", filename: str = "talk.MP4") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\n'
+        f"ignored\r\n"
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: video/mp4\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def in_pieces(body: bytes, size: int = 7):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def save(body: bytes, tmp_path, **kwargs):
+    return asyncio.run(upload_store.save_multipart_stream(
+        in_pieces(body), CONTENT_TYPE, upload_dir=str(tmp_path), **kwargs))
+
+
+def test_file_field_is_stored_under_its_hash(tmp_path):
+    payload = os.urandom(5000)
+    path, content_hash, filename = save(multipart_body(payload), tmp_path)
+
+    assert content_hash == hashlib.sha256(payload).hexdigest()
+    assert filename == "talk.MP4"
+    assert path == os.path.join(str(tmp_path), content_hash, "source.mp4")
+    with open(path, "rb") as f:
+        assert f.read() == payload
+    # Nothing but the hash directory is left behind
+    assert os.listdir(tmp_path) == [content_hash]
+
+
+def test_identical_upload_reuses_the_same_path(tmp_path):
+    payload = b"same content"
+    first = save(multipart_body(payload), tmp_path)
+    second = save(multipart_body(payload, filename="other.mp4"), tmp_path)
+    assert first[:2] == second[:2]
+
+
+def test_oversized_upload_is_rejected_and_cleaned_up(tmp_path):
+    with pytest.raises(upload_store.UploadTooLargeError):
+        save(multipart_body(b"x" * 200), tmp_path, max_bytes=100)
+    assert os.listdir(tmp_path) == []
+
+
+def test_missing_file_field_is_an_error(tmp_path):
+    with pytest.raises(ValueError):
+        save(multipart_body(b"data", field="attachment"), tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_non_multipart_body_is_an_error(tmp_path):
+    with pytest.raises(ValueError):
+        asyncio.run(upload_store.save_multipart_stream(
+            in_pieces(b"raw"), "application/octet-stream", upload_dir=str(tmp_path)))
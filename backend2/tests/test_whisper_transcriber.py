@@ -0,0 +1,48 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+whisper = pytest.importorskip("whisper")
+
+import whisper_transcriber
+
+
+@pytest.fixture
+def tiny_checkpoint(tmp_path):
+    """A randomly initialised, very small Whisper model saved the way load_model expects"""
+    from dataclasses import asdict
+    from whisper.model import ModelDimensions, Whisper
+
+    dims = ModelDimensions(n_mels=80, n_audio_ctx=1500, n_audio_state=8, n_audio_head=1,
+                           n_audio_layer=1, n_vocab=51865, n_text_ctx=448, n_text_state=8,
+                           n_text_head=1, n_text_layer=1)
+    path = tmp_path / "tiny.pt"
+    torch.save({"dims": asdict(dims), "model_state_dict": Whisper(dims).state_dict()}, path)
+    return str(path)
+
+
+def test_whisper_resolves_to_openai_package():
+    # A local module called whisper.py used to shadow the package
+    assert hasattr(whisper, "load_model")
+    assert whisper.__file__ != whisper_transcriber.__file__
+
+
+def test_get_transcriber_builds_model(monkeypatch, tiny_checkpoint):
+    monkeypatch.setattr(whisper_transcriber, "WHISPER_MODEL_NAME", tiny_checkpoint)
+    monkeypatch.setattr(whisper_transcriber, "_idle_transcribers", [])
+
+    transcriber = whisper_transcriber.get_transcriber()
+    transcriber._ensure_model()
+
+    assert isinstance(transcriber._model, whisper.model.Whisper)
+
+
+def test_checked_out_transcriber_is_not_shared(monkeypatch, tiny_checkpoint):
+    monkeypatch.setattr(whisper_transcriber, "WHISPER_MODEL_NAME", tiny_checkpoint)
+    monkeypatch.setattr(whisper_transcriber, "_idle_transcribers", [])
+
+    first = whisper_transcriber.get_transcriber()
+    second = whisper_transcriber.get_transcriber()
+    assert first is not second
+
+    whisper_transcriber.release_transcriber(first)
+    assert whisper_transcriber.get_transcriber() is first
@@ -0,0 +1,162 @@
+import re
+import requests
+from typing import Callable, Dict, List
+
+# Ollama serves a model with num_ctx tokens of context unless the Modelfile overrides it
+OLLAMA_DEFAULT_NUM_CTX = 2048
+# Used when the vocabulary cannot be fetched; deliberately pessimistic for English text
+FALLBACK_CHARS_PER_TOKEN = 3.0
+# Share of the context held back when counting with the model vocabulary, which can undercount
+VOCAB_SAFETY_MARGIN = 0.25
+# The character estimate already overcounts, so it only needs the usual headroom
+FALLBACK_SAFETY_MARGIN = 0.1
+# GGUF tokenizer.ggml.model values that use SentencePiece's '▁' word-boundary pieces
+SPM_TOKENIZER_MODELS = ('llama',)
+# Longest vocabulary piece tried during greedy matching
+MAX_PIECE_LENGTH = 24
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+class VocabTokenCounter:
+    """Approximate token counts using the served model's own SentencePiece vocabulary.
+
+    Greedy longest-match tends to find fewer pieces than SentencePiece BPE, so the
+    counts can be low; chunks sized with it use VOCAB_SAFETY_MARGIN to compensate.
+    """
+    def __init__(self, tokens: List[str]):
+        self.vocab = set(tokens)
+        self.max_piece = min(MAX_PIECE_LENGTH, max((len(t) for t in tokens), default=1))
+
+    def __call__(self, text: str) -> int:
+        text = '▁' + text.replace(' ', '▁')
+        count = 0
+        i = 0
+        while i < len(text):
+            for length in range(min(self.max_piece, len(text) - i), 0, -1):
+                if text[i:i + length] in self.vocab:
+                    count += 1
+                    i += length
+                    break
+            else:
+                # Unknown character: SentencePiece falls back to one token per UTF-8 byte
+                count += len(text[i].encode('utf-8'))
+                i += 1
+        return count
+
+
+def fallback_token_counter(text: str) -> int:
+    return int(len(text) / FALLBACK_CHARS_PER_TOKEN) + 1
+
+
+def fetch_model_info(base_url: str, model: str, timeout: float = 10) -> Dict:
+    """Read context length, tokenizer type and vocabulary for `model` from Ollama's /api/show"""
+    response = requests.post(f"{base_url}/api/show", json={"model": model, "verbose": True}, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    model_info = data.get('model_info', {})
+
+    trained_ctx = next((v for k, v in model_info.items() if k.endswith('.context_length')), None)
+    num_ctx = None
+    for line in data.get('parameters', '').splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == 'num_ctx':
+            num_ctx = int(parts[1])
+
+    context_length = num_ctx or OLLAMA_DEFAULT_NUM_CTX
+    if trained_ctx:
+        context_length = min(context_length, int(trained_ctx))
+
+    return {
+        'context_length': context_length,
+        'tokenizer_model': model_info.get('tokenizer.ggml.model'),
+        'tokens': model_info.get('tokenizer.ggml.tokens') or []
+    }
+
+
+class TokenAwareChunker:
+    """Packs transcript segments into chunks that fit the model's context window.
+
+    Each segment is tokenized once and chunks are built by adding segment counts,
+    splitting oversized segments on sentence and then word boundaries.
+    """
+    def __init__(self, context_length: int, count_tokens: Callable[[str], int],
+                 prompt_tokens: int, output_tokens: int, safety_margin: float = 0.1):
+        self.context_length = context_length
+        self.count_tokens = count_tokens
+        usable = int(context_length * (1 - safety_margin))
+        self.chunk_tokens = usable - prompt_tokens - output_tokens
+        if self.chunk_tokens <= 0:
+            raise ValueError(f"Context of {context_length} tokens leaves no room for transcript text")
+
+    def _split_oversized(self, text: str) -> List[str]:
+        pieces = []
+        for sentence in SENTENCE_PATTERN.split(text):
+            if self.count_tokens(sentence) <= self.chunk_tokens:
+                pieces.append(sentence)
+                continue
+            # A single sentence longer than a chunk: fall back to word boundaries
+            words, current = [], 0
+            for word in sentence.split():
+                word_tokens = self.count_tokens(word)
+                if word_tokens > self.chunk_tokens:
+                    # No boundary at all (e.g. a URL or garbage run): cut it evenly by characters
+                    parts = -(-word_tokens // self.chunk_tokens)
+                    step = -(-len(word) // parts)
+                    if words:
+                        pieces.append(' '.join(words))
+                        words, current = [], 0
+                    pieces.extend(word[i:i + step] for i in range(0, len(word), step))
+                    continue
+                if words and current + word_tokens > self.chunk_tokens:
+                    pieces.append(' '.join(words))
+                    words, current = [], 0
+                words.append(word)
+                current += word_tokens
+            if words:
+                pieces.append(' '.join(words))
+        return pieces
+
+    def split_segments(self, segments: List[str]) -> List[str]:
+        chunks = []
+        current, current_tokens = [], 0
+        for segment in segments:
+            segment = segment.strip()
+            if not segment:
+                continue
+            tokens = self.count_tokens(segment)
+            pieces = [(segment, tokens)] if tokens <= self.chunk_tokens else \
+                [(p, self.count_tokens(p)) for p in self._split_oversized(segment)]
+            for piece, piece_tokens in pieces:
+                # +1 for the space joining it to the previous piece
+                if current and current_tokens + piece_tokens + 1 > self.chunk_tokens:
+                    chunks.append(' '.join(current))
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += piece_tokens + 1
+        if current:
+            chunks.append(' '.join(current))
+        return chunks
+
+
+def build_chunker(base_url: str, model: str, prompt_templates: List[str],
+                  output_tokens: int = 512) -> TokenAwareChunker:
+    """Create a chunker for the served model; raises if Ollama cannot describe the model"""
+    try:
+        info = fetch_model_info(base_url, model)
+    except Exception as e:
+        raise RuntimeError(f"Could not read model info for '{model}' from Ollama: {e}")
+    context_length = info['context_length']
+    # VocabTokenCounter only understands SentencePiece vocabularies; a BPE (gpt2-style)
+    # vocabulary encodes spaces differently and would be miscounted
+    use_vocab = bool(info['tokens']) and info['tokenizer_model'] in SPM_TOKENIZER_MODELS
+    if use_vocab:
+        count_tokens, safety_margin = VocabTokenCounter(info['tokens']), VOCAB_SAFETY_MARGIN
+    else:
+        count_tokens, safety_margin = fallback_token_counter, FALLBACK_SAFETY_MARGIN
+    print(f"Model '{model}': context {context_length} tokens, tokenizer "
+          f"'{info['tokenizer_model']}', {'model vocabulary' if use_vocab else 'character estimate'} for token counts")
+
+    # The refine prompt also carries the previous answer, which is at most output_tokens long
+    prompt_tokens = max(count_tokens(template) for template in prompt_templates) + output_tokens
+    return TokenAwareChunker(context_length, count_tokens, prompt_tokens, output_tokens, safety_margin)
@@ -0,0 +1,172 @@
+import os
+import json
+import asyncio
+import shutil
+import hashlib
+import tempfile
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_DIR = 'Saved_Uploads'
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # written to disk in batches of about 1 MiB
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 2 * 1024 ** 3))
+RESULT_FILENAME = 'result.json'
+
+
+def upload_dir_for_hash(content_hash: str, upload_dir: str = UPLOAD_DIR) -> str:
+    return os.path.join(upload_dir, content_hash)
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds UPLOAD_MAX_BYTES"""
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the {max_bytes} byte limit")
+        self.max_bytes = max_bytes
+
+
+def _parse_content_disposition(value: bytes) -> Tuple[Optional[str], Optional[str]]:
+    _, params = parse_options_header(value)
+    name, filename = params.get(b'name'), params.get(b'filename')
+    return (name.decode('utf-8', 'replace') if name is not None else None,
+            filename.decode('utf-8', 'replace') if filename is not None else None)
+
+
+async def save_multipart_stream(stream: AsyncIterator[bytes], content_type: str, field_name: str = 'file',
+                                max_bytes: int = UPLOAD_MAX_BYTES,
+                                upload_dir: str = UPLOAD_DIR) -> Tuple[str, str, str]:
+    """Parse a multipart/form-data body as it arrives and write one file field to disk.
+
+    The request body is never spooled elsewhere first: bytes of `field_name` are
+    hashed and written (in batches of UPLOAD_CHUNK_SIZE, off the event loop) as
+    they are parsed. The file is then moved into a directory named after its
+    SHA-256 so identical uploads always end up at the same place.
+
+    Returns (path, sha256 hex digest, original filename).
+    """
+    mime_type, params = parse_options_header(content_type)
+    boundary = params.get(b'boundary')
+    if mime_type != b'multipart/form-data' or not boundary:
+        raise ValueError("Expected a multipart/form-data upload")
+
+    os.makedirs(upload_dir, exist_ok=True)
+    hasher = hashlib.sha256()
+    state = {'size': 0, 'pending_size': 0, 'in_file': False, 'found': False, 'filename': '',
+             'header_field': b'', 'header_value': b'', 'headers': {}}
+    pending = []
+
+    def on_part_begin():
+        state['headers'] = {}
+
+    def on_header_field(data, start, end):
+        state['header_field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state['header_value'] += data[start:end]
+
+    def on_header_end():
+        state['headers'][state['header_field'].lower()] = state['header_value']
+        state['header_field'], state['header_value'] = b'', b''
+
+    def on_headers_finished():
+        name, filename = _parse_content_disposition(state['headers'].get(b'content-disposition', b''))
+        # Only the first file in the expected field is kept; other form fields are ignored
+        state['in_file'] = name == field_name and filename is not None and not state['found']
+        if state['in_file']:
+            state['found'] = True
+            state['filename'] = filename
+
+    def on_part_data(data, start, end):
+        if state['in_file']:
+            chunk = data[start:end]
+            state['size'] += len(chunk)
+            if state['size'] > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            hasher.update(chunk)
+            pending.append(chunk)
+            state['pending_size'] += len(chunk)
+
+    def on_part_end():
+        state['in_file'] = False
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end,
+    })
+
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out_file:
+            async for body_chunk in stream:
+                parser.write(body_chunk)
+                if state['pending_size'] >= UPLOAD_CHUNK_SIZE:
+                    await asyncio.to_thread(out_file.writelines, list(pending))
+                    pending.clear()
+                    state['pending_size'] = 0
+            parser.finalize()
+            if pending:
+                await asyncio.to_thread(out_file.writelines, pending)
+                pending.clear()
+
+        if not state['found']:
+            raise ValueError(f"No file found in form field '{field_name}'")
+        if state['size'] == 0:
+            raise ValueError("Uploaded file is empty")
+
+        content_hash = hasher.hexdigest()
+        target_dir = upload_dir_for_hash(content_hash, upload_dir)
+        os.makedirs(target_dir, exist_ok=True)
+
+        # Keep the original extension so ffmpeg/Whisper can sniff the container
+        ext = os.path.splitext(state['filename'])[1].lower()
+        target_path = os.path.join(target_dir, f"source{ext}")
+        if os.path.exists(target_path):
+            os.remove(tmp_path)
+        else:
+            shutil.move(tmp_path, target_path)
+        return target_path, content_hash, state['filename']
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_cached_result(content_hash: str, upload_dir: str = UPLOAD_DIR) -> Optional[Dict[str, Any]]:
+    """Return the stored transcript/summary for this content hash, if any"""
+    result_path = os.path.join(upload_dir_for_hash(content_hash, upload_dir), RESULT_FILENAME)
+    if not os.path.exists(result_path):
+        return None
+    try:
+        with open(result_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Debug - Ignoring unreadable cached result {result_path}: {e}")
+        return None
+
+
+def discard_upload_media(content_hash: str, upload_dir: str = UPLOAD_DIR):
+    """Delete the uploaded media and its checkpoint once the result is stored"""
+    target_dir = upload_dir_for_hash(content_hash, upload_dir)
+    if not os.path.isdir(target_dir):
+        return
+    for name in os.listdir(target_dir):
+        if name != RESULT_FILENAME:
+            try:
+                os.remove(os.path.join(target_dir, name))
+            except OSError as e:
+                print(f"Debug - Could not remove {name} from {target_dir}: {e}")
+
+
+def save_cached_result(content_hash: str, result: Dict[str, Any], upload_dir: str = UPLOAD_DIR):
+    """Persist transcript/summary for this content hash (atomic replace)"""
+    target_dir = upload_dir_for_hash(content_hash, upload_dir)
+    os.makedirs(target_dir, exist_ok=True)
+    result_path = os.path.join(target_dir, RESULT_FILENAME)
+    tmp_path = result_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, result_path)
@@ -0,0 +1,268 @@
+import os 
+import json
+import math
+import hashlib
+import subprocess
+import threading
+import torch 
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+import librosa
+import tempfile
+
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+# Whisper model size (or path to a checkpoint file) used by the API
+WHISPER_MODEL_NAME = os.getenv('WHISPER_MODEL', 'base')
+WHISPER_SAMPLE_RATE = 16000
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+class WhisperTranscriber:
+    def __init__(self, model_name: str = "base"):
+        # don't import or load heavy libraries at module import time
+        self.model_name = model_name
+        self._model = None
+        self._model_lock = threading.Lock()
+
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        print(f"Device: {self.device}")
+
+    @staticmethod
+    def load_audio(file_path: str, target_sampling_rate: int = 16000) -> Tuple[np.ndarray, int]:
+
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+        
+        try:
+            audio, sr = librosa.load(file_path, sr=target_sampling_rate, mono= True)
+            return(audio, sr)
+        except Exception as e:
+            raise Exception(f"Error loading audio file: {e}")
+        
+    @staticmethod
+    def load_audio_window(file_path: str, start: float, duration: float,
+                          sampling_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+        """Decode only [start, start + duration) seconds of any ffmpeg-readable file as mono float32"""
+        cmd = [
+            "ffmpeg", "-nostdin", "-threads", "0",
+            "-ss", str(start), "-t", str(duration), "-i", file_path,
+            "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sampling_rate), "-"
+        ]
+        try:
+            out = subprocess.run(cmd, capture_output=True, check=True).stdout
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Error loading audio file: {e.stderr.decode(errors='ignore')}")
+        return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+    @staticmethod
+    def probe_duration(file_path: str) -> Optional[float]:
+        """Container duration in seconds from ffprobe, or None if it can't be determined"""
+        cmd = [
+            "ffprobe", "-v", "error", "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1", file_path
+        ]
+        try:
+            out = subprocess.run(cmd, capture_output=True, check=True, text=True).stdout.strip()
+            return float(out)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            print(f"Could not read duration of {file_path}: {e}")
+            return None
+
+    @staticmethod
+    def chunk_audio(audio: np.ndarray, chunk_length: int = 30, sampling_rate: int = 16000) -> List[np.ndarray]:
+        chunk_size = chunk_length * sampling_rate
+        return[audio[i+1:i+chunk_size] for i in range(0, len(audio), chunk_size)]
+    
+    def format_timestamp(self, seconds: int) -> str:
+        """Convert seconds to HH:MM:SS format"""
+        hours = seconds // 3600
+        minutes = (seconds % 3600) // 60
+        seconds = seconds % 60
+        return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+    def transcribe_chunk(self, chunk: np.ndarray, sampling_rate: int = 16000) -> str:
+        self._ensure_model()
+        
+        # OpenAI Whisper expects audio as a torch tensor or numpy array in float32
+        # normalized to [-1, 1] range
+        if chunk.dtype != np.float32:
+            chunk = chunk.astype(np.float32)
+        
+        # Whisper internally expects 16kHz audio
+        # Use fp16=False to avoid potential issues on CPU
+        result = self._model.transcribe(
+            chunk,
+            language="en",
+            task="transcribe",
+            fp16=(self.device == 'cuda')  # Only use fp16 on CUDA
+        )
+        return result.get("text", "")
+    
+    def transcribe(self, file_path: str, chunk_length: int = 30, window_seconds: int = 600) -> dict:
+        """Transcribe audio file and return dict with time ranges as keys.
+
+        The audio is processed in windows of `window_seconds`; after each window the
+        segments so far are saved to `<file_path>.checkpoint.json` together with the
+        audio hash, so a retried job resumes from the last finished window.
+        """
+        self._ensure_model()
+
+        checkpoint_path = file_path + CHECKPOINT_SUFFIX
+        audio_hash = file_sha256(file_path)
+        state = self._load_checkpoint(checkpoint_path, audio_hash, window_seconds)
+        if state is None:
+            duration = self.probe_duration(file_path)
+            state = {
+                'audio_hash': audio_hash,
+                'window_seconds': window_seconds,
+                # None when ffprobe can't tell; then only an empty window ends the loop
+                'total_windows': max(1, math.ceil(duration / window_seconds)) if duration else None,
+                'completed_windows': 0,
+                'segments': []
+            }
+        elif state['completed_windows'] and not self._is_complete(state):
+            print(f"Resuming transcription at window {state['completed_windows'] + 1}")
+
+        # Decode one window at a time so memory stays flat and a resume skips straight ahead
+        while not self._is_complete(state):
+            index = state['completed_windows']
+            offset = index * window_seconds
+            window = self.load_audio_window(file_path, offset, window_seconds)
+            if not len(window) and state.get('total_windows') is None:
+                state['total_windows'] = index
+                self._save_checkpoint(checkpoint_path, state)
+                break
+            if len(window):
+                # Carry the previous text over so Whisper keeps context across windows
+                previous_text = state['segments'][-1]['text'] if state['segments'] else None
+                result = self._model.transcribe(
+                    window,
+                    language="en",
+                    task="transcribe",
+                    fp16=(self.device == 'cuda'),
+                    initial_prompt=previous_text,
+                    verbose=True  # Show progress
+                )
+                for segment in result.get('segments', []):
+                    state['segments'].append({
+                        'start': segment['start'] + offset,
+                        'end': segment['end'] + offset,
+                        'text': segment['text'].strip()
+                    })
+            state['completed_windows'] = index + 1
+            self._save_checkpoint(checkpoint_path, state)
+            print(f"Transcribed window {index + 1}/{state.get('total_windows') or '?'}")
+
+        # Extract segments with timestamps
+        transcriptions = {}
+        for segment in state['segments']:
+            start_time = int(segment['start'])
+            end_time = int(segment['end'])
+            time_range = f"{self.format_timestamp(start_time)} - {self.format_timestamp(end_time)}"
+            if segment['text']:
+                transcriptions[time_range] = segment['text']
+
+        return transcriptions
+
+    @staticmethod
+    def _is_complete(state: Dict) -> bool:
+        total = state.get('total_windows')
+        return total is not None and state['completed_windows'] >= total
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_path: str, audio_hash: str, window_seconds: int) -> Optional[Dict]:
+        if not os.path.exists(checkpoint_path):
+            return None
+        try:
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {checkpoint_path}: {e}")
+            return None
+        # Only resume if it is the same audio split the same way
+        if state.get('audio_hash') != audio_hash or state.get('window_seconds') != window_seconds:
+            print(f"Checkpoint {checkpoint_path} does not match the audio, starting over")
+            return None
+        return state
+
+    @staticmethod
+    def _save_checkpoint(checkpoint_path: str, state: Dict):
+        tmp_path = checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, checkpoint_path)
+    
+    def _ensure_model(self):
+        # transcribe() may run on several worker threads; load the weights only once
+        with self._model_lock:
+            if self._model is None:
+                # import inside function so importing this module stays cheap
+                import whisper
+                # load_model will download/load weights; choose model_name per needs
+                print(f"Loading Whisper model '{self.model_name}'...")
+                self._model = whisper.load_model(self.model_name, device=self.device)
+                print("Model loaded successfully!")
+
+# openai-whisper installs kv-cache hooks on the model for every decode, so a model must
+# never be used by two threads at once: each whisper-stage slot checks out its own copy.
+_idle_transcribers: List[WhisperTranscriber] = []
+_transcriber_lock = threading.Lock()
+
+def get_transcriber() -> WhisperTranscriber:
+    """Check out an idle WhisperTranscriber, creating one if all are busy.
+
+    Hand it back with release_transcriber(); the whisper stage limiter bounds how
+    many exist, so there is at most one loaded model per concurrent slot.
+    """
+    with _transcriber_lock:
+        if _idle_transcribers:
+            return _idle_transcribers.pop()
+    return WhisperTranscriber(model_name=WHISPER_MODEL_NAME)
+
+def release_transcriber(transcriber: WhisperTranscriber):
+    with _transcriber_lock:
+        _idle_transcribers.append(transcriber)
+
+def transcribe_file(file_path: str) -> dict:
+    """Transcribe any ffmpeg-readable audio/video file with a transcriber of its own"""
+    transcriber = get_transcriber()
+    try:
+        return transcriber.transcribe(file_path)
+    finally:
+        release_transcriber(transcriber)
+
+def main():
+    try:
+        # Initialize with a larger model for better accuracy
+        transcriber = WhisperTranscriber(model_name='base')
+        audio_file = "sample_audio.mp3"
+        
+        # Check if the file exists
+        if not os.path.exists(audio_file):
+            raise FileNotFoundError(f"Audio file not found: {audio_file}")
+        
+        # Check if the file is empty
+        if os.path.getsize(audio_file) == 0:
+            raise ValueError(f"Audio file is empty: {audio_file}")
+        
+        transcriptions = transcriber.transcribe(audio_file, chunk_length=30)
+        
+        # Print transcriptions in time-ordered format
+        for time_range, text in transcriptions.items():
+            print(f'Timestamp: {time_range}')
+            print(f'Transcription: {text}\n')
+            
+    except FileNotFoundError as e:
+        print(f"File error: {e}")
+    except ValueError as e:
+        print(f"Invalid file error: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file